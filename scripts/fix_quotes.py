@@ -0,0 +1,114 @@
+"""Normalize quotation marks in .tex files to LaTeX conventions.
+
+This script finds straight ASCII double quotes and common Unicode “smart”
+quotes and replaces them with LaTeX-style opening `` and closing '' marks.
+It operates on .tex files under the given root (default: repository root).
+Backups are written with a .bak extension next to each modified file.
+
+Usage: python scripts/fix_quotes.py [--root ROOT]
+"""
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import os
+import re
+import shutil
+import argparse
+
+
+# Files are processed as raw UTF-8 bytes. The ASCII " never occurs inside a
+# multi-byte sequence, and the smart quotes form one contiguous block,
+# U+2018..U+201F, whose encodings all share the lead bytes E2 80.
+# The single/double split is a fixed range of the last byte, so each half is
+# a constant replacement handled entirely inside the regex engine.
+REPLACEMENTS = (
+    # Left/right single smart quotes and their low/reversed forms -> ASCII '
+    (re.compile(b'\xe2\x80[\x98-\x9b]'), b"'"),
+    # Common Unicode smart quotes to ASCII double quote
+    (re.compile(b'\xe2\x80[\x9c-\x9f]'), b'"'),
+)
+
+# Any character normalize_text may rewrite; text without one is left as is
+_QUOTE_CHARS_PATTERN = re.compile(b'"|\xe2\x80[\x98-\x9f]')
+
+DOUBLE_QUOTE_PATTERN = re.compile(rb'"(.*?)"', flags=re.DOTALL)
+# Backreference template: the substitution runs entirely inside the regex engine
+DOUBLE_QUOTE_TEMPLATE = rb"``\1''"
+
+
+def normalize_text(text: bytes) -> bytes:
+    # Fast path: a single scan is enough for files without any quotes
+    if _QUOTE_CHARS_PATTERN.search(text) is None:
+        return text
+
+    # First normalize smart quotes to ASCII equivalents
+    for pat, repl in REPLACEMENTS:
+        text = pat.sub(repl, text)
+
+    # Then convert ASCII double-quoted segments to LaTeX quotes
+    return DOUBLE_QUOTE_PATTERN.sub(DOUBLE_QUOTE_TEMPLATE, text)
+
+
+def process_file(path: Path) -> bool:
+    # Bytes in, bytes out: no UTF-8 decode/encode round-trip per file
+    text = path.read_bytes()
+    new = normalize_text(text)
+    if new != text:
+        bak = path.with_suffix(path.suffix + '.bak')
+        if path.is_symlink():
+            # Renaming would move the link itself; write through it instead
+            bak.write_bytes(text)
+            path.write_bytes(new)
+        else:
+            # The original bytes become the backup by rename; only new is
+            # written, with the original file's permission bits carried over
+            os.replace(path, bak)
+            path.write_bytes(new)
+            shutil.copymode(bak, path)
+        return True
+    return False
+
+
+def find_tex_files(root: Path):
+    for p in root.rglob('*.tex'):
+        yield p
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--root', default='.', help='Repository root path')
+    args = parser.parse_args()
+    root = Path(args.root).resolve()
+
+    modified = []
+    # Files are independent and, with the quote-free fast path, mostly I/O
+    # bound; threads overlap the reads and writes without the start-up cost of
+    # worker processes. Results are collected in discovery order so the report
+    # stays stable.
+    with ThreadPoolExecutor() as executor:
+        jobs = []
+        # rglob yields a symlinked .tex and its target separately; submit each
+        # physical file once so two workers never rewrite it concurrently
+        seen = set()
+        for f in find_tex_files(root):
+            real = f.resolve()
+            if real in seen:
+                continue
+            seen.add(real)
+            jobs.append((f, executor.submit(process_file, f)))
+        for f, job in jobs:
+            try:
+                if job.result():
+                    modified.append(str(f.relative_to(root)))
+            except Exception as e:
+                print(f"Error processing {f}: {e}")
+
+    if modified:
+        print('Modified files:')
+        for m in modified:
+            print(' -', m)
+    else:
+        print('No changes made.')
+
+
+if __name__ == '__main__':
+    main()
@@ -10,10 +10,15 @@ Binary files are detected heuristically and noted instead of being dumped.
 from __future__ import annotations
 
 import argparse
+import fnmatch
+import os
+import re
 import subprocess
 import sys
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, Iterable, List
+from typing import Deque, Dict, Iterable, Iterator, List, NamedTuple, Optional, Pattern, Tuple, Union
 
 # (no diagnostics) -- keep behavior minimal for production use
 
@@ -29,50 +34,42 @@ def get_repo_root(script_path: Path) -> Path:
         return script_path.parent
 
 
-def gather_repo_files(root: Path) -> List[Path]:
-    """Return repo files that are not ignored according to git."""
+def gather_repo_files(root: Path, strict_ignore: bool = False) -> List[Path]:
+    """Return repo files that are not ignored according to git.
+
+    `git ls-files --exclude-standard` already honors .gitignore, so paths are
+    only re-matched against the root .gitignore when strict_ignore is set
+    (e.g. to also drop tracked files that a later .gitignore entry covers).
+    Paths are not stat'ed. A tracked file that vanished from disk (or was
+    replaced by a directory, or lost its parent directory) stays in the
+    listing and is rendered as "[missing file: skipped]" by
+    read_file_for_markdown. Such stale entries can make one path both a file
+    and a parent directory, which build_tree keeps apart.
+    """
+    cmd = ["git", "ls-files", "-z", "--exclude-standard", "--others", "--cached"]
     try:
-        output = subprocess.check_output(
-            ["git", "ls-files", "--exclude-standard", "--others", "--cached"],
-            cwd=root,
-        )
+        # Read the NUL-separated listing straight from the pipe as bytes; each
+        # entry is decoded only when its Path is built.
+        with subprocess.Popen(cmd, cwd=root, stdout=subprocess.PIPE) as proc:
+            output = proc.stdout.read()
+        if proc.returncode:
+            raise subprocess.CalledProcessError(proc.returncode, cmd)
     except (subprocess.CalledProcessError, FileNotFoundError) as exc:
         # If git is not available or fails, fall back to walking the filesystem.
         sys.stderr.write(f"Notice: git unavailable or failed ({exc}). Falling back to filesystem walk.\n")
         return gather_files_by_walk(root)
-    raw_paths = [line.strip() for line in output.decode().splitlines() if line.strip()]
+    ignore_re = compile_gitignore_patterns(load_gitignore_patterns(root)) if strict_ignore else None
     resolved = []
-    missing = []
-    # load .gitignore patterns so we can filter out files that should be ignored
-    patterns = load_gitignore_patterns(root)
-    for p in raw_paths:
-        full = root / p
-        if full.exists():
-            # if the path matches a .gitignore pattern, skip it (user prefers ignored files omitted)
-            try:
-                if path_matches_gitignore(full, root, patterns):
-                    continue
-            except Exception:
-                pass
-            # explicit rule: skip any files in sty/ or with .sty extension (user requested)
-            try:
-                rel = full.relative_to(root).as_posix()
-                if rel.startswith("sty/") or full.suffix == ".sty":
-                    continue
-            except Exception:
-                pass
-            resolved.append(full)
-        else:
-            missing.append(p)
-    if missing:
-        # Don't fail; just warn the user which git-tracked paths were not found on disk.
-        sys.stderr.write(
-            "Warning: git reported paths that do not exist on disk. They will be skipped:\n"
-        )
-        for m in missing[:20]:
-            sys.stderr.write(f"  - {m}\n")
-        if len(missing) > 20:
-            sys.stderr.write(f"  ...and {len(missing)-20} more\n")
+    for entry in output.split(b"\0"):
+        if not entry:
+            continue
+        # explicit rule: skip any files in sty/ or with .sty extension (user requested)
+        if entry.startswith(b"sty/") or entry.endswith(b".sty"):
+            continue
+        rel = entry.decode()
+        if path_matches_gitignore(rel, ignore_re):
+            continue
+        resolved.append(root / rel)
     return resolved
 
 
@@ -102,38 +99,52 @@ def load_gitignore_patterns(root: Path) -> List[str]:
     return patterns
 
 
-def path_matches_gitignore(path: Path, root: Path, patterns: List[str]) -> bool:
-    """Return True if the given path matches any simple .gitignore pattern.
+# fnmatch() compares case-insensitively where the OS does (e.g. Windows)
+_GLOB_FLAGS = "(?i:{})" if os.path.normcase("A") == "a" else "(?:{})"
+# Prefix that lets a pattern match only the last component of a relative path
+_NAME_PREFIX = r"(?:.*/)?(?=[^/]*\Z)"
 
-    Supports directory patterns ending with '/', simple globs with '*', and
-    direct filename patterns like '*.sty'. This is a conservative matcher and
+
+def compile_gitignore_patterns(
+    patterns: List[str], dirs_only: bool = False
+) -> Optional[Pattern[str]]:
+    """Compile simple .gitignore patterns into one regex over relative paths.
+
+    Supports directory patterns ending with '/', simple globs with '*' or '?'
+    (matched against the whole relative path or the file name), and direct
+    filename patterns like 'Cargo.lock'. This is a conservative matcher and
     does not implement the full .gitignore spec (no negations, no nested
     .gitignore handling) which is sufficient for this project's needs.
-    """
-    if not patterns:
-        return False
-    try:
-        rel = path.relative_to(root).as_posix()
-    except Exception:
-        rel = path.as_posix()
-    from fnmatch import fnmatch
 
+    With dirs_only, only the directory patterns are compiled: a directory
+    path they match can be skipped as a whole, while globs (whose '?' and
+    '[...]' may match '/') must still be checked per file.
+    Returns None when there is nothing to match.
+    """
+    alternatives: List[str] = []
     for pat in patterns:
         # directory pattern
         if pat.endswith("/"):
-            p = pat.rstrip("/")
-            if rel == p or rel.startswith(p + "/"):
-                return True
+            alternatives.append(re.escape(pat.rstrip("/")) + r"(?:/|\Z)")
+        elif dirs_only:
             continue
         # wildcard or glob
-        if "*" in pat or "?" in pat or (pat.count("*") > 0):
-            if fnmatch(rel, pat) or fnmatch(path.name, pat):
-                return True
-            continue
+        elif "*" in pat or "?" in pat:
+            glob = fnmatch.translate(pat)
+            alternatives.append(_GLOB_FLAGS.format(glob))
+            alternatives.append(_NAME_PREFIX + _GLOB_FLAGS.format(glob))
         # explicit filename or path
-        if rel == pat or path.name == pat:
-            return True
-    return False
+        else:
+            alternatives.append(re.escape(pat) + r"\Z")
+            alternatives.append(_NAME_PREFIX + re.escape(pat) + r"\Z")
+    if not alternatives:
+        return None
+    return re.compile("|".join(alternatives))
+
+
+def path_matches_gitignore(rel: str, ignore_re: Optional[Pattern[str]]) -> bool:
+    """Return True if the repo-relative posix path matches the compiled patterns."""
+    return ignore_re is not None and ignore_re.match(rel) is not None
 
 
 def gather_files_by_walk(root: Path) -> List[Path]:
@@ -143,60 +154,106 @@ def gather_files_by_walk(root: Path) -> List[Path]:
     accurate for common ignore patterns.
     """
     patterns = load_gitignore_patterns(root)
+    ignore_re = compile_gitignore_patterns(patterns)
+    # only directory patterns ("build/") may skip a directory as a whole
+    prune_re = compile_gitignore_patterns(patterns, dirs_only=True)
     files: List[Path] = []
-    for p in root.rglob("*"):
-        if p.is_file():
-            rel = p.relative_to(root).as_posix()
-            skip = False
-            for pat in patterns:
-                # directory pattern
-                if pat.endswith("/"):
-                    if rel.startswith(pat.rstrip("/")):
-                        skip = True
-                        break
-                else:
-                    # use simple fnmatch on posix path
-                    from fnmatch import fnmatch
-
-                    if fnmatch(rel, pat) or fnmatch(p.name, pat):
-                        skip = True
-                        break
-            if not skip:
-                files.append(p)
+    # os.scandir reports file/dir type from the directory read itself, so no
+    # extra stat is needed per entry; relative paths are built as strings.
+    pending = [(root, "")]
+    while pending:
+        directory, rel_dir = pending.pop()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    rel = rel_dir + entry.name
+                    if entry.is_dir(follow_symlinks=False):
+                        if not path_matches_gitignore(rel, prune_re):
+                            pending.append((entry.path, rel + "/"))
+                    elif entry.is_file() and not path_matches_gitignore(rel, ignore_re):
+                        files.append(Path(entry.path))
+        except OSError:
+            continue
     return files
 
 
-def build_tree(paths: Iterable[Path], root: Path) -> Dict[str, dict]:
-    """Construct a nested dict representing the directory tree."""
-    tree: Dict[str, dict] = {}
-    for path in paths:
-        relative_parts = list(path.relative_to(root).parts)
-        cursor = tree
+class FileRecord(NamedTuple):
+    """A file to document, with the path strings derived from it computed once."""
+
+    path: Path
+    rel: str  # repo-relative posix path
+    fence_lang: str
+
+
+def make_record(path: Path, root: Path) -> FileRecord:
+    """Build the FileRecord for a file under root."""
+    rel = path.relative_to(root).as_posix()
+    _, dot, ext = rel.rpartition(".")
+    return FileRecord(path, rel, ext if dot else "text")
+
+
+# A rendered tree is a list of (name, node) entries, directories first and
+# then files, each group sorted by name; a directory's node is its list of
+# child entries and a file's node is its FileRecord.
+TreeEntry = Tuple[str, Union[list, FileRecord]]
+
+
+def build_tree(records: Iterable[FileRecord]) -> List[TreeEntry]:
+    """Construct the sorted directory tree for the given files."""
+    # Each level is a (directories, files) pair of dicts. Keeping the two
+    # apart means a stale git listing with both `x` and `x/y` keeps both.
+    nested: Tuple[Dict[str, tuple], Dict[str, FileRecord]] = ({}, {})
+    for record in records:
+        relative_parts = record.rel.split("/")
+        directories, files = nested
         for part in relative_parts[:-1]:
-            cursor = cursor.setdefault(part, {})
-        cursor.setdefault("__files__", []).append(relative_parts[-1])
+            directories, files = directories.setdefault(part, ({}, {}))
+        files[relative_parts[-1]] = record
+    # Sort every level exactly once, filling each directory's children list
+    # from an explicit stack rather than through recursion.
+    tree: List[TreeEntry] = []
+    pending = [(nested, tree)]
+    while pending:
+        (directories, files), entries = pending.pop()
+        for name in sorted(directories):
+            children: List[TreeEntry] = []
+            entries.append((name, children))
+            pending.append((directories[name], children))
+        entries.extend((name, files[name]) for name in sorted(files))
     return tree
 
 
-def render_tree(tree: Dict[str, dict], prefix: str = "") -> List[str]:
-    """Render the nested dict into a list of tree lines."""
+_BRANCH, _LAST_BRANCH = "├──", "└──"
+_PIPE_PAD, _BLANK_PAD = "│   ", "    "
+
+
+def render_tree(tree: List[TreeEntry]) -> Tuple[List[str], List[FileRecord]]:
+    """Render the sorted tree into a list of tree lines.
+
+    Also returns the file records in the order they were rendered, so the
+    content section can follow the tree without sorting the files again.
+    """
     lines: List[str] = []
-    entries = []
-    directories = sorted([k for k in tree.keys() if k != "__files__"])
-    for directory in directories:
-        entries.append((directory, True))
-    files = tree.get("__files__", [])
-    for filename in sorted(files):
-        entries.append((filename, False))
-
-    for index, (name, is_dir) in enumerate(entries):
-        connector = "└──" if index == len(entries) - 1 else "├──"
-        lines.append(f"{prefix}{connector} {name}")
-        if is_dir:
-            next_prefix = f"{prefix}    " if index == len(entries) - 1 else f"{prefix}│   "
-            sub_tree = tree[name]
-            lines.extend(render_tree(sub_tree, next_prefix))
-    return lines
+    ordered: List[FileRecord] = []
+    # Explicit depth-first stack of (entry, prefix, is_last); children are
+    # pushed in reverse so they pop in sorted order.
+    stack = [(entry, "", index == len(tree) - 1) for index, entry in enumerate(tree)]
+    stack.reverse()
+    while stack:
+        (name, node), prefix, is_last = stack.pop()
+        lines.append(f"{prefix}{_LAST_BRANCH if is_last else _BRANCH} {name}")
+        if isinstance(node, FileRecord):
+            ordered.append(node)
+            continue
+        next_prefix = prefix + (_BLANK_PAD if is_last else _PIPE_PAD)
+        last = len(node) - 1
+        for index in range(last, -1, -1):
+            stack.append((node[index], next_prefix, index == last))
+    return lines, ordered
+
+
+# Bytes counted as printable text by detect_binary
+_PRINTABLE_BYTES = bytes(sorted({7, 8, 9, 10, 12, 13, 27, *range(0x20, 0x7F)}))
 
 
 def detect_binary(data: bytes) -> bool:
@@ -205,68 +262,117 @@ def detect_binary(data: bytes) -> bool:
         return False
     if b"\0" in data:
         return True
-    printable = {7, 8, 9, 10, 12, 13, 27}
-    printable.update(range(0x20, 0x7F))
-    printable_count = sum(1 for byte in data if byte in printable)
+    # Deleting the printable bytes leaves only the non-printable ones; both
+    # translate and len run in C instead of a per-byte Python loop.
+    printable_count = len(data) - len(data.translate(None, _PRINTABLE_BYTES))
     ratio = printable_count / len(data)
     return ratio < 0.7
 
 
+# Only the start of a file is inspected to decide whether it is binary
+SNIFF_BYTES = 8192
+# Extensions that are always treated as binary without reading the file
+BINARY_EXTENSIONS = frozenset({
+    ".png", ".jpg", ".jpeg", ".gif", ".bmp", ".ico", ".webp", ".tif", ".tiff",
+    ".pdf", ".zip", ".tar", ".gz", ".tgz", ".bz2", ".xz", ".7z", ".whl",
+    ".so", ".dll", ".exe", ".mp3", ".mp4", ".parquet", ".npy", ".npz", ".pt", ".bin",
+})
+
+
 def read_file_for_markdown(path: Path) -> str:
-    """Return Markdown-safe representation of the file contents."""
+    """Return Markdown-safe representation of the file contents.
+
+    Files with a BINARY_EXTENSIONS suffix are only stat'ed. Otherwise binary
+    detection looks at the first SNIFF_BYTES, so a binary file costs one
+    small read and an fstat instead of being loaded whole. Text files are
+    still read completely: the trailing whitespace trim needs the end of the
+    content anyway.
+    """
     try:
-        data = path.read_bytes()
-    except FileNotFoundError:
+        if path.suffix.lower() in BINARY_EXTENSIONS:
+            return f"[binary file omitted – {path.stat().st_size} bytes]"
+        with path.open("rb") as fh:
+            head = fh.read(SNIFF_BYTES)
+            if detect_binary(head):
+                size = os.fstat(fh.fileno()).st_size
+                return f"[binary file omitted – {size} bytes]"
+            data = head + fh.read()
+    except (FileNotFoundError, NotADirectoryError, IsADirectoryError):
+        # stale git index entries: the file is gone or a directory took its place
         return "[missing file: skipped]"
     except OSError as e:
         return f"[error reading file: {e}]"
-    if detect_binary(data):
-        size = len(data)
-        return f"[binary file omitted – {size} bytes]"
     text = data.decode("utf-8", errors="replace")
     return text.rstrip() + "\n"
 
 
-def create_markdown(root: Path, files: List[Path], output_path: Path) -> str:
+# Reads are I/O bound, so oversubscribe the CPUs to keep the storage queue busy
+READ_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+
+
+def iter_file_bodies(
+    records: List[FileRecord], workers: int = READ_WORKERS
+) -> Iterator[Tuple[FileRecord, str]]:
+    """Yield (record, read_file_for_markdown(record.path)) for each record, in order.
+
+    Files are read ahead on a thread pool while the caller writes earlier
+    bodies; at most 2 * workers bodies are in flight, so memory stays bounded.
+    """
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending: Deque[Tuple[FileRecord, Future]] = deque()
+        for record in records:
+            pending.append((record, pool.submit(read_file_for_markdown, record.path)))
+            if len(pending) >= 2 * workers:
+                done, future = pending.popleft()
+                yield done, future.result()
+        while pending:
+            done, future = pending.popleft()
+            yield done, future.result()
+
+
+def write_markdown(root: Path, files: List[Path], output_path: Path) -> None:
+    """Write the Markdown dump to output_path, one file section at a time.
+
+    Sections are streamed to a buffered file handle instead of being joined
+    into a single string, so memory stays bounded by the largest file.
+    """
     header = [f"# {root.name}", "", "Generated by generate_repo_markdown.py.", ""]
     # Force-include .github/copilot-instructions.md in the tree when present on disk,
     # but do NOT include its full text in the "Contenido de archivos" section.
-    ci = root / ".github" / "copilot-instructions.md"
-    files_for_tree = list(files)
-    if ci.exists() and ci not in files_for_tree:
-        files_for_tree = files_for_tree + [ci]
+    # Exclusions are compared on repo-relative posix strings, which avoids a
+    # resolve() (realpath) call per file.
+    ci_rel = ".github/copilot-instructions.md"
     # Exclude the generator script itself from the tree and content
-    gen_script = (root / "scripts" / "generate_repo_markdown.py").resolve()
-    files_for_tree = [f for f in files_for_tree if f.resolve() != gen_script]
+    excluded = {"scripts/generate_repo_markdown.py"}
     # Exclude the output file itself from both lists
-    files_for_tree = [f for f in files_for_tree if f.resolve() != output_path.resolve()]
-    # For content, exclude the copilot instructions file explicitly
-    files_for_content = [f for f in files_for_tree if f.resolve() != ci.resolve()]
-    tree = build_tree(files_for_tree, root)
+    try:
+        excluded.add(output_path.relative_to(root.resolve()).as_posix())
+    except ValueError:
+        pass  # output written outside the repository
+    # Parse each path once; the tree and content sections reuse the records
+    records = [make_record(f, root) for f in files]
+    records_for_tree = [r for r in records if r.rel not in excluded]
+    ci = root / ci_rel
+    if ci.exists() and all(r.rel != ci_rel for r in records_for_tree):
+        records_for_tree.append(make_record(ci, root))
+    tree = build_tree(records_for_tree)
+    rendered, ordered = render_tree(tree)
     tree_lines = ["## Estructura", "", "```", "."]
-    tree_lines.extend(render_tree(tree))
+    tree_lines.extend(rendered)
     tree_lines.append("```")
     tree_lines.append("")
     # No diagnostics in final output
+    # Content follows the tree order; exclude the copilot instructions file explicitly
+    records_for_content = [r for r in ordered if r.rel != ci_rel]
 
-    content_sections: List[str] = ["## Contenido de archivos", ""]
-    for file_path in sorted(files_for_content):
-        relative = file_path.relative_to(root).as_posix()
-        # Explicitly skip the copilot instructions file from content embedding
-        if relative == ".github/copilot-instructions.md":
-            continue
-        content_sections.append(f"### `{relative}`")
-        content_sections.append("")
-        body = read_file_for_markdown(file_path)
-        fence_lang = relative.split(".")[-1] if "." in relative else "text"
-        content_sections.append(f"```{fence_lang}")
-        content_sections.append(body)
-        if not body.endswith("\n"):
-            content_sections.append("")
-        content_sections.append("```")
-        content_sections.append("")
-
-    return "\n".join(header + tree_lines + content_sections)
+    with open(output_path, "w", encoding="utf-8", buffering=1 << 20) as out:
+        out.write("\n".join(header + tree_lines))
+        out.write("\n## Contenido de archivos\n")
+        for record, body in iter_file_bodies(records_for_content):
+            out.write(f"\n### `{record.rel}`\n\n```{record.fence_lang}\n")
+            out.write(body)
+            # A blank line always precedes the closing fence
+            out.write("\n```\n" if body.endswith("\n") else "\n\n```\n")
 
 
 def parse_args(argv: List[str]) -> argparse.Namespace:
@@ -281,6 +387,11 @@ def parse_args(argv: List[str]) -> argparse.Namespace:
         default=None,
         help="Optional path to repository root (fallback when git fails).",
     )
+    parser.add_argument(
+        "--strict-ignore",
+        action="store_true",
+        help="Also filter git-listed files against the root .gitignore patterns.",
+    )
     return parser.parse_args(argv)
 
 
@@ -294,9 +405,8 @@ def main(argv: List[str]) -> None:
         root = get_repo_root(script_path)
     output_path = (root / args.output).resolve()
     # gather files (git-based primary, filesystem fallback handled inside)
-    files = gather_repo_files(root)
-    markdown = create_markdown(root, files, output_path)
-    output_path.write_text(markdown, encoding="utf-8")
+    files = gather_repo_files(root, strict_ignore=args.strict_ignore)
+    write_markdown(root, files, output_path)
     print(f"Markdown written to {output_path}")
 
 